@@ -0,0 +1,64 @@
+"""
+UXCam MCP Server - project paths and code snippets
+Shared by the integration steps in uxcam_server.py
+"""
+
+import os
+from pathlib import Path
+
+# ---------- constants ----------
+GRADLE_GROOVY   = Path("app/build.gradle")
+GRADLE_KTS      = Path("app/build.gradle.kts")
+SETTINGS_GROOVY = Path("settings.gradle")
+SETTINGS_KTS    = Path("settings.gradle.kts")
+MANIFEST_PATH   = Path("app/src/main/AndroidManifest.xml")
+SOURCE_ROOT     = Path("app/src")
+MAIN_SOURCE_DIRS = (Path("app/src/main/java"), Path("app/src/main/kotlin"))
+# Per-project records of which file holds the init call, so later runs can skip
+# the source scan; kept outside the project so nothing lands in the user's tree
+INTEGRATION_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "uxcam-mcp"
+
+# Build outputs and IDE folders under app/src that never hold hand-written sources
+SKIP_DIRS = frozenset({"build", ".gradle", ".idea", ".cxx", "generated",
+                       "intermediates", "outputs", "tmp", "node_modules"})
+SOURCE_EXTENSIONS = (".kt", ".java")
+
+ANDROID_NS        = "{http://schemas.android.com/apk/res/android}"
+ACTION_MAIN       = "android.intent.action.MAIN"
+CATEGORY_LAUNCHER = "android.intent.category.LAUNCHER"
+
+MAVEN_REPO_SNIPPET = 'maven { url "https://sdk.uxcam.com/android/" }'
+MAVEN_REPO_SNIPPET_KTS = 'maven("https://sdk.uxcam.com/android/")'
+
+DEP_LINE_GROOVY = "implementation 'com.uxcam:uxcam:3.+'"
+DEP_LINE_KTS    = 'implementation("com.uxcam:uxcam:3.+")'
+
+BUILD_CONFIG_FIELD_GROOVY = '        buildConfigField "String", "%(name)s", "\\"${project.findProperty(\\"%(name)s\\") ?: \\"\\"}\\"'
+BUILD_CONFIG_FIELD_KTS    = '        buildConfigField("String", "%(name)s", "\\"${project.findProperty(\\"%(name)s\\") ?: \\"\\"}\\")'
+
+# Build-script flavour by file suffix (settings.gradle[.kts], app/build.gradle[.kts])
+REPO_SNIPPETS       = {".kts": MAVEN_REPO_SNIPPET_KTS, ".gradle": MAVEN_REPO_SNIPPET}
+DEP_LINES           = {".kts": DEP_LINE_KTS, ".gradle": DEP_LINE_GROOVY}
+BUILD_CONFIG_FIELDS = {".kts": BUILD_CONFIG_FIELD_KTS, ".gradle": BUILD_CONFIG_FIELD_GROOVY}
+
+JAVA_SNIPPET = '''
+        // UXCam initialization
+        String uxcamKey = %s;
+        UXConfig config = new UXConfig.Builder(uxcamKey)
+                .enableIntegrationLogging(BuildConfig.DEBUG)
+                .build();
+        UXCam.startWithConfiguration(config);'''
+
+KOTLIN_SNIPPET = '''
+        // UXCam initialization
+        val uxcamKey = %s
+        val config = UXConfig.Builder(uxcamKey)
+            .enableIntegrationLogging(BuildConfig.DEBUG)
+            .build()
+        UXCam.startWithConfiguration(config)'''
+
+JAVA_IMPORTS = '''import com.uxcam.UXCam;
+import com.uxcam.datamodel.UXConfig;'''
+
+KOTLIN_IMPORTS = '''import com.uxcam.UXCam
+import com.uxcam.datamodel.UXConfig'''
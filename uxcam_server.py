@@ -5,119 +5,245 @@ Compatible with latest MCP SDK
 """
 
 import asyncio
-import json
+from collections import OrderedDict
+import contextlib
+from dataclasses import dataclass
+import functools
+import hashlib
+import mmap
+import os
 from pathlib import Path
 import re
-from typing import Any, Sequence
-
-from mcp.server import Server
-from mcp.types import Tool, TextContent, CallToolResult
-
-# ---------- constants ----------
-GRADLE_GROOVY   = Path("app/build.gradle")
-GRADLE_KTS      = Path("app/build.gradle.kts")
-SETTINGS_GROOVY = Path("settings.gradle")
-SETTINGS_KTS    = Path("settings.gradle.kts")
-MANIFEST_PATH   = Path("app/src/main/AndroidManifest.xml")
-
-MAVEN_REPO_SNIPPET = 'maven { url "https://sdk.uxcam.com/android/" }'
-MAVEN_REPO_SNIPPET_KTS = 'maven("https://sdk.uxcam.com/android/")'
-
-DEP_LINE_GROOVY = "implementation 'com.uxcam:uxcam:3.+'"
-DEP_LINE_KTS    = 'implementation("com.uxcam:uxcam:3.+")'
-
-JAVA_SNIPPET = '''
-        // UXCam initialization
-        String uxcamKey = %s;
-        UXConfig config = new UXConfig.Builder(uxcamKey)
-                .enableIntegrationLogging(BuildConfig.DEBUG)
-                .build();
-        UXCam.startWithConfiguration(config);'''
-
-KOTLIN_SNIPPET = '''
-        // UXCam initialization
-        val uxcamKey = %s
-        val config = UXConfig.Builder(uxcamKey)
-            .enableIntegrationLogging(BuildConfig.DEBUG)
-            .build()
-        UXCam.startWithConfiguration(config)'''
-
-JAVA_IMPORTS = '''import com.uxcam.UXCam;
-import com.uxcam.datamodel.UXConfig;'''
-
-KOTLIN_IMPORTS = '''import com.uxcam.UXCam
-import com.uxcam.datamodel.UXConfig'''
+import shutil
+import sys
+import threading
+from typing import Sequence
+import xml.etree.ElementTree as ET
+
+from uxcam_constants import (
+    GRADLE_GROOVY, GRADLE_KTS, SETTINGS_GROOVY, SETTINGS_KTS, MANIFEST_PATH,
+    SOURCE_ROOT, MAIN_SOURCE_DIRS, INTEGRATION_CACHE_DIR, SKIP_DIRS,
+    SOURCE_EXTENSIONS, ANDROID_NS, ACTION_MAIN, CATEGORY_LAUNCHER,
+    REPO_SNIPPETS, DEP_LINES, BUILD_CONFIG_FIELDS, JAVA_SNIPPET, KOTLIN_SNIPPET,
+    JAVA_IMPORTS, KOTLIN_IMPORTS,
+)
+
+# ---------- precompiled patterns ----------
+# Any of "extends Application", ": Application()" or ": Application " in one pass;
+# bytes so candidate files are never decoded. Only a literal space may follow a
+# bare ": Application", so a property typed Application at the end of a line
+# (lateinit var app: Application) does not count
+_RE_APP_MARKER = re.compile(rb"extends Application\b|:[ \t]*Application(?:\(\)| )")
+# Fallback for manifests ElementTree rejects: one <activity> element at a time,
+# self-closing ones included, so a match never runs past its own element
+_RE_ACTIVITY      = re.compile(r'<activity\b([^>]*?)(?:/>|>(.*?)</activity>)', re.DOTALL)
+_RE_ANDROID_NAME  = re.compile(r'android:name\s*=\s*["\']([^"\']*)["\']')
+
+# "Already integrated" guards for init injection, found in one scan
+_INIT_MARKER = "UXCam.startWithConfiguration"
+_IMPORT_MARKER = "import com.uxcam.UXCam"
+_RE_UXCAM_MARKERS = re.compile(r'UXCam\.startWithConfiguration|import com\.uxcam\.UXCam')
+# Superclass markers for the launcher activity candidate, also matched on raw bytes
+_ACTIVITY_MARKERS = (b"extends Activity", b"extends AppCompatActivity",
+                     b": Activity", b": AppCompatActivity")
+
+# Gradle blocks edited by add_repo / _insert_buildconfig_field
+_RE_DEP_RES_REPOS  = re.compile(r'dependencyResolutionManagement\s*{[^}]*repositories\s*{', re.DOTALL)
+_RE_ANDROID_BLOCK  = re.compile(r'android\s*{')
+_RE_DEFAULT_CONFIG = re.compile(r'(defaultConfig\s*{[^}]*})', re.DOTALL)
+
+# Where add_imports anchors the UXCam imports
+_RE_PACKAGE      = re.compile(r'^[ \t]*package\s[^\n]*(?:\n|\Z)', re.MULTILINE)
+_RE_FIRST_IMPORT = re.compile(r'^[ \t]*import\s', re.MULTILINE)
+
+# onCreate() header plus, when present, the first super.onCreate() call after it,
+# so a single match ends where the init snippet goes
+# Application.onCreate() takes no arguments
+_RE_KT_APP_ONCREATE   = re.compile(r'override\s+fun\s+onCreate\s*\(\s*\)\s*{'
+                                   r'(?:.*?super\.onCreate\s*\(\s*\))?', re.DOTALL)
+_RE_JAVA_APP_ONCREATE = re.compile(r'@Override\s*\n\s*public\s+void\s+onCreate\s*\(\s*\)\s*{'
+                                   r'(?:.*?super\.onCreate\s*\(\s*\)\s*;?)?', re.DOTALL)
+
+# Activity.onCreate(savedInstanceState)
+_RE_KT_ONCREATE   = re.compile(r'override\s+fun\s+onCreate\s*\([^)]*\)\s*{'
+                               r'(?:.*?super\.onCreate\s*\([^)]*\))?', re.DOTALL)
+_RE_JAVA_ONCREATE = re.compile(r'@Override\s*\n\s*protected\s+void\s+onCreate\s*\([^)]*\)\s*{'
+                               r'(?:.*?super\.onCreate\s*\([^)]*\)\s*;?)?', re.DOTALL)
+
+# ---------- file access ----------
+def _write_if_changed(path, old, new):
+    """Atomically replace path with new text; returns False when there is nothing to write"""
+    if new is None or new == old:
+        return False
+    
+    # Write a sibling temp file and rename it over the target so a crash
+    # never leaves a half-written build script or source file behind. Resolve
+    # first so a symlinked local.properties or build.gradle stays a symlink
+    target = path.resolve()
+    tmp = target.with_name(target.name + ".tmp")
+    try:
+        tmp.write_text(new)
+        try:
+            st = target.stat()
+        except FileNotFoundError:
+            pass
+        else:
+            shutil.copymode(target, tmp)
+            # Keep the owner too; only possible where we may chown
+            with contextlib.suppress(OSError):
+                os.chown(tmp, st.st_uid, st.st_gid)
+        os.replace(tmp, target)
+    except OSError:
+        # Never leave the temp file behind in the user's project
+        with contextlib.suppress(OSError):
+            tmp.unlink()
+        raise
+    return True
+
+class FileCache:
+    """Per-request file cache: every file is read at most once and written once on flush"""
+    
+    def __init__(self):
+        self._r = {}
+        self._original = {}
+        # Insertion-ordered so files are written back in the order they were edited
+        self._dirty = {}
+    
+    def read(self, path):
+        """Return the file's current text, or None if it does not exist"""
+        if path not in self._r:
+            try:
+                text = _read_cached(path)
+            except FileNotFoundError:
+                text = None
+            self._r[path] = self._original[path] = text
+        return self._r[path]
+    
+    def exists(self, path):
+        """Check existence, taking pending writes into account"""
+        return self.read(path) is not None
+    
+    def write(self, path, text):
+        """Replace the file's text in memory; flush() puts it on disk"""
+        self.read(path)
+        self._r[path] = text
+        self._dirty[path] = None
+    
+    def apply(self, path, result):
+        """Store a mutator's (new_text_or_none, message) result and return the message"""
+        new, message = result
+        if new is not None:
+            self.write(path, new)
+        return message
+    
+    def flush(self):
+        """Write every changed file back to disk"""
+        for path in self._dirty:
+            _write_if_changed(path, self._original[path], self._r[path])
+        self._dirty.clear()
 
 # ---------- repository functions ----------
-def add_repo():
-    """Add UXCam Maven repository to settings.gradle in dependencyResolutionManagement"""
+def _find_block_open(txt, keyword):
+    """Index just past the brace of the first `keyword {` block, or -1 if there is none"""
+    idx = txt.find(keyword)
+    while idx != -1:
+        end = idx + len(keyword)
+        brace = txt.find("{", end)
+        if brace == -1:
+            return -1
+        # Only whitespace may sit between the keyword and its brace
+        if not txt[end:brace].strip():
+            return brace + 1
+        idx = txt.find(keyword, end)
+    return -1
+
+# Each mutator takes a file's current text and returns (new_text_or_none, message);
+# the caller decides what to write back.
+
+# Reports for a missing build script; every later step would fail the same way
+_NO_BUILD_SCRIPTS = "⚠️ Neither settings.gradle nor app/build.gradle found"
+_NO_APP_GRADLE    = "⚠️ app/build.gradle file not found"
+
+def add_repo(target, txt):
+    """Add UXCam Maven repository to settings.gradle in dependencyResolutionManagement
+    
+    Returns None when the repo has to go into app/build.gradle instead
+    """
     # Priority 1: Try settings.gradle first
-    target = SETTINGS_KTS if SETTINGS_KTS.exists() else SETTINGS_GROOVY
-    
-    if target.exists():
-        txt = target.read_text()
-        snippet = MAVEN_REPO_SNIPPET_KTS if target.suffix == ".kts" else MAVEN_REPO_SNIPPET
-        
-        if snippet in txt:
-            return "ℹ️ Maven repo already present in settings.gradle"
-        
-        # Look for dependencyResolutionManagement { repositories { pattern
-        pattern = r'dependencyResolutionManagement\s*{[^}]*repositories\s*{'
-        match = re.search(pattern, txt, re.DOTALL)
-        
-        if match:
-            # Add to dependencyResolutionManagement repositories
-            new = re.sub(r'(dependencyResolutionManagement\s*{[^}]*repositories\s*{)',
-                        lambda m: m.group(0) + f"\n        {snippet}",
-                        txt, count=1)
-            target.write_text(new)
-            return f"✔️ Added UXCam Maven repo in {target} (dependencyResolutionManagement)"
-        else:
-            # No dependencyResolutionManagement found, fall back to app/build.gradle
-            return add_repo_fallback()
-    else:
+    if txt is None:
         # No settings.gradle found, fall back to app/build.gradle
-        return add_repo_fallback()
+        return None
+    
+    snippet = REPO_SNIPPETS[target.suffix]
+    
+    if snippet in txt:
+        return None, "ℹ️ Maven repo already present in settings.gradle"
+    
+    # Add to the dependencyResolutionManagement { repositories { block in one pass
+    new, found = _RE_DEP_RES_REPOS.subn(lambda m: m.group(0) + f"\n        {snippet}",
+                                        txt, count=1)
+    
+    if found:
+        return new, f"✔️ Added UXCam Maven repo in {target} (dependencyResolutionManagement)"
+    
+    # No dependencyResolutionManagement found, fall back to app/build.gradle
+    return None
 
-def add_repo_fallback():
+def add_repo_fallback(target, txt):
     """Fallback: Add UXCam Maven repository to app/build.gradle"""
-    target = GRADLE_KTS if GRADLE_KTS.exists() else GRADLE_GROOVY
-    if not target.exists():
-        return "⚠️ Neither settings.gradle nor app/build.gradle found"
+    if txt is None:
+        return None, _NO_BUILD_SCRIPTS
 
-    txt = target.read_text()
-    snippet = MAVEN_REPO_SNIPPET_KTS if target.suffix == ".kts" else MAVEN_REPO_SNIPPET
+    snippet = REPO_SNIPPETS[target.suffix]
     
     if snippet in txt:
-        return "ℹ️ Maven repo already present in app/build.gradle"
+        return None, "ℹ️ Maven repo already present in app/build.gradle"
         
     # Look for repositories block in app/build.gradle
-    new = re.sub(r"repositories\s*{",
-                 lambda m: m.group(0) + f"\n        {snippet}",
-                 txt, count=1)
-    target.write_text(new)
-    return f"✔️ Added UXCam Maven repo in {target} (fallback)"
+    brace = _find_block_open(txt, "repositories")
+    if brace == -1:
+        return None, f"⚠️ No repositories block found in {target}"
+    new = txt[:brace] + f"\n        {snippet}" + txt[brace:]
+    return new, f"✔️ Added UXCam Maven repo in {target} (fallback)"
 
-def add_dependency():
+def add_dependency(target, txt):
     """Add UXCam dependency to app/build.gradle"""
-    target = GRADLE_KTS if GRADLE_KTS.exists() else GRADLE_GROOVY
-    if not target.exists():
-        return "⚠️ app/build.gradle file not found"
+    if txt is None:
+        return None, _NO_APP_GRADLE
 
-    txt = target.read_text()
-    line = DEP_LINE_KTS if target.suffix == ".kts" else DEP_LINE_GROOVY
+    line = DEP_LINES[target.suffix]
     
     if line in txt:
-        return "ℹ️ Dependency already present"
+        return None, "ℹ️ Dependency already present"
         
-    new = re.sub(r"dependencies\s*{",
-                 lambda m: m.group(0) + f"\n    {line}",
-                 txt, count=1)
-    target.write_text(new)
-    return f"✔️ Added UXCam dependency in {target}"
+    brace = _find_block_open(txt, "dependencies")
+    if brace == -1:
+        return None, f"⚠️ No dependencies block found in {target}"
+    new = txt[:brace] + f"\n    {line}" + txt[brace:]
+    return new, f"✔️ Added UXCam dependency in {target}"
 
 # ---------- app key handling functions ----------
-def handle_app_key(app_key_ref):
+@functools.lru_cache(maxsize=128)
+def _local_property_re(var_name):
+    """Compiled VARIABLE_NAME=value pattern for local.properties"""
+    return re.compile(rf'^{re.escape(var_name)}\s*=\s*(.+)$', re.MULTILINE)
+
+@functools.lru_cache(maxsize=128)
+def _property_line_re(var_name):
+    """Compiled pattern for a whole VARIABLE_NAME=... line in local.properties"""
+    return re.compile(rf'^[ \t]*{re.escape(var_name)}=.*$', re.MULTILINE)
+
+@functools.lru_cache(maxsize=128)
+def _buildconfig_field_re(var_name):
+    """Compiled buildConfigField pattern that exposes var_name
+    
+    The findProperty / System.getenv / literal-value forms all extend this
+    base match, so one per-line pattern covers them.
+    """
+    name = re.escape(var_name)
+    return re.compile(rf'buildConfigField[^\n]*["\']String["\'][^\n]*["\']?{name}["\']?', re.IGNORECASE)
+
+def handle_app_key(files, app_key_ref):
     """
     Intelligently handle app key reference with proper security and BuildConfig setup
     
@@ -137,22 +263,35 @@ def handle_app_key(app_key_ref):
     # Scenario 1: Already a BuildConfig reference
     if cleaned_key.startswith("BuildConfig."):
         var_name = cleaned_key.replace("BuildConfig.", "")
-        return handle_buildconfig_reference(var_name)
+        return handle_buildconfig_reference(files, var_name)
     
     # Scenario 2: Direct API key (long string, contains dashes/alphanumeric)
     if is_likely_api_key(cleaned_key):
-        return handle_direct_api_key(cleaned_key)
+        return handle_direct_api_key(files, cleaned_key)
     
     # Scenario 3: Variable name (user wants to reference a variable)
-    return handle_variable_reference(cleaned_key)
+    return handle_variable_reference(files, cleaned_key)
 
 def is_likely_api_key(value):
     """Check if value looks like an actual API key"""
     # UXCam keys are typically long alphanumeric strings
-    return (len(value) > 20 and 
-            any(c.isalnum() for c in value) and
-            not value.isalpha() and  # Not just letters
-            not value.isdigit())     # Not just numbers
+    if len(value) <= 20:
+        return False
+    
+    # One pass: some alphanumeric, not just letters, not just numbers
+    has_alnum = has_non_alpha = has_non_digit = False
+    for c in value:
+        if c.isalpha():
+            has_alnum = has_non_digit = True
+        elif c.isdigit():
+            has_alnum = has_non_alpha = True
+        else:
+            has_non_alpha = has_non_digit = True
+            has_alnum = has_alnum or c.isalnum()
+        if has_alnum and has_non_alpha and has_non_digit:
+            return True
+    
+    return False
 
 def handle_no_key_provided():
     """Guide user when no key is provided"""
@@ -161,17 +300,18 @@ def handle_no_key_provided():
 2. Add to local.properties: UXCAM_KEY=your-actual-key
 3. Run: "Add UXCam with app key UXCAM_KEY" """
 
-def handle_buildconfig_reference(var_name):
+def handle_buildconfig_reference(files, var_name):
     """Handle BuildConfig.VARIABLE_NAME references"""
     # First check if BuildConfig variable is already properly exposed
-    if is_buildconfig_variable_exposed(var_name):
+    target, gradle = _read_gradle(files)
+    if gradle is not None and _buildconfig_field_present(gradle, var_name):
         # It's already exposed in BuildConfig - we're good to go!
         return f'BuildConfig.{var_name}'
     
     # Not exposed yet - try to find it in local.properties and expose it
-    local_props_value = find_in_local_properties(var_name)
+    local_props_value = find_in_local_properties(files, var_name)
     if local_props_value:
-        expose_in_buildconfig(var_name)
+        _expose_in_buildconfig_unchecked(files, var_name, gradle, target)
         return f'BuildConfig.{var_name}'
     else:
         return f"""⚠️ BuildConfig.{var_name} not found. Please either:
@@ -179,26 +319,31 @@ def handle_buildconfig_reference(var_name):
 2. Ensure it's already exposed in build.gradle buildConfigField
 Then run this command again"""
 
-def handle_direct_api_key(api_key):
+def handle_direct_api_key(files, api_key):
     """Securely handle direct API key - store in local.properties"""
-    # Never hardcode - store securely
-    store_in_local_properties("UXCAM_KEY", api_key)
-    expose_in_buildconfig("UXCAM_KEY")
+    # Never hardcode - store securely, keep it out of git and expose it via BuildConfig
+    target, _ = _read_gradle(files)
+    apply_edits(files, [
+        (Path("local.properties"), lambda txt: _set_property(txt, "UXCAM_KEY", api_key)),
+        (Path(".gitignore"), _ensure_gitignored_local_properties),
+        (target, lambda txt: _add_buildconfig_field(txt, target, "UXCAM_KEY")),
+    ])
     
     return 'BuildConfig.UXCAM_KEY'
 
-def handle_variable_reference(var_name):
+def handle_variable_reference(files, var_name):
     """Handle variable name reference"""
     # First check if it's already exposed in BuildConfig
-    if is_buildconfig_variable_exposed(var_name):
+    target, gradle = _read_gradle(files)
+    if gradle is not None and _buildconfig_field_present(gradle, var_name):
         return f'BuildConfig.{var_name}'
     
     # Not in BuildConfig yet - look for it in local.properties
-    value = find_in_local_properties(var_name)
+    value = find_in_local_properties(files, var_name)
     
     if value:
         # Found it, expose in BuildConfig
-        expose_in_buildconfig(var_name)
+        _expose_in_buildconfig_unchecked(files, var_name, gradle, target)
         return f'BuildConfig.{var_name}'
     else:
         return f"""⚠️ Variable '{var_name}' not found. Please either:
@@ -206,17 +351,14 @@ def handle_variable_reference(var_name):
 2. Ensure it's already exposed in build.gradle buildConfigField
 Then run this command again"""
 
-def find_in_local_properties(var_name):
+def find_in_local_properties(files, var_name):
     """Find a variable in local.properties"""
-    local_props = Path("local.properties")
-    if not local_props.exists():
-        return None
-    
     try:
-        content = local_props.read_text()
+        content = files.read(Path("local.properties"))
+        if content is None:
+            return None
         # Look for VARIABLE_NAME=value
-        pattern = rf'^{re.escape(var_name)}\s*=\s*(.+)$'
-        match = re.search(pattern, content, re.MULTILINE)
+        match = _local_property_re(var_name).search(content)
         if match:
             return match.group(1).strip().strip('"').strip("'")
     except Exception:
@@ -224,363 +366,640 @@ def find_in_local_properties(var_name):
     
     return None
 
-def store_in_local_properties(var_name, value):
-    """Store a variable in local.properties securely"""
-    local_props = Path("local.properties")
-    
-    # Read existing content
-    if local_props.exists():
-        content = local_props.read_text()
-        lines = content.split('\n')
-    else:
-        lines = []
-    
-    # Check if variable already exists
-    var_exists = False
-    for i, line in enumerate(lines):
-        if line.strip().startswith(f"{var_name}="):
-            lines[i] = f"{var_name}={value}"
-            var_exists = True
-            break
-    
-    # Add if doesn't exist
-    if not var_exists:
-        if lines and not lines[-1].strip():
-            lines[-1] = f"{var_name}={value}"
-        else:
-            lines.append(f"{var_name}={value}")
-    
-    # Write back
-    local_props.write_text('\n'.join(lines))
-    
-    # Make sure local.properties is in .gitignore
-    ensure_gitignore_has_local_properties()
-
-def ensure_gitignore_has_local_properties():
-    """Ensure local.properties is in .gitignore for security"""
-    gitignore = Path(".gitignore")
+def apply_edits(files, edits):
+    """Apply (path, transform) edits in order; each path is read and written once via files
     
-    if gitignore.exists():
-        content = gitignore.read_text()
-        if "local.properties" not in content:
-            gitignore.write_text(content + "\nlocal.properties\n")
-    else:
-        gitignore.write_text("local.properties\n")
+    A transform gets the current text (None for a missing file) and returns the
+    new text, or None to leave the file alone.
+    """
+    for path, transform in edits:
+        new = transform(files.read(path))
+        if new is not None:
+            files.write(path, new)
+
+def _set_property(content, var_name, value):
+    """Return local.properties text with var_name set to value"""
+    entry = f"{var_name}={value}"
+    if content is None:
+        return entry
+    
+    # Replace the first existing assignment in one pass
+    new_content, replaced = _property_line_re(var_name).subn(lambda _: entry, content, count=1)
+    if replaced:
+        return new_content
+    
+    # Otherwise append, reusing a trailing blank line
+    head, sep, last = content.rpartition('\n')
+    if not last.strip():
+        return head + sep + entry
+    return content + '\n' + entry
+
+def _ensure_gitignored_local_properties(content):
+    """Return .gitignore text that ignores local.properties, or None if it already does"""
+    if content is None:
+        return "local.properties\n"
+    if "local.properties" not in content:
+        return content + "\nlocal.properties\n"
+    return None
 
-def is_buildconfig_variable_exposed(var_name):
-    """Check if a variable is exposed in BuildConfig (comprehensive)"""
-    target = GRADLE_KTS if GRADLE_KTS.exists() else GRADLE_GROOVY
-    if not target.exists():
+def _buildconfig_field_present(content, var_name):
+    """Check if gradle text already declares a buildConfigField for var_name"""
+    # Cheap case-insensitive substring checks before any regex work
+    lowered = content.lower()
+    if "buildconfigfield" not in lowered or var_name.lower() not in lowered:
         return False
     
-    content = target.read_text()
-    
-    # Look for various buildConfigField patterns:
-    patterns = [
-        # Standard buildConfigField
-        rf'buildConfigField.*["\']String["\'].*["\']?{re.escape(var_name)}["\']?',
-        # With project.findProperty
-        rf'buildConfigField.*["\']String["\'].*["\']?{re.escape(var_name)}["\']?.*findProperty',
-        # Environment variable reference
-        rf'buildConfigField.*["\']String["\'].*["\']?{re.escape(var_name)}["\']?.*System\.getenv',
-        # Direct value assignment
-        rf'buildConfigField.*["\']String["\'].*["\']?{re.escape(var_name)}["\']?.*["\'].*["\']',
-    ]
-    
-    for pattern in patterns:
-        if re.search(pattern, content, re.IGNORECASE):
-            return True
-    
-    return False
+    return _buildconfig_field_re(var_name).search(content) is not None
 
-def expose_in_buildconfig(var_name):
-    """Expose a local.properties variable in BuildConfig"""
-    target = GRADLE_KTS if GRADLE_KTS.exists() else GRADLE_GROOVY
-    if not target.exists():
-        return False
-    
-    content = target.read_text()
+def _read_gradle(files):
+    """Return (target, content) for the app build script, preferring Kotlin DSL"""
+    target = GRADLE_KTS if files.exists(GRADLE_KTS) else GRADLE_GROOVY
+    return target, files.read(target)
+
+def _add_buildconfig_field(content, target, var_name):
+    """Return gradle text exposing var_name via buildConfigField
     
+    None when the file is missing, already exposes it, or has no android block.
+    """
     # Check if already exposed
-    if is_buildconfig_variable_exposed(var_name):
-        return True
+    if content is None or _buildconfig_field_present(content, var_name):
+        return None
     
+    return _insert_buildconfig_field(content, target, var_name)
+
+def _insert_buildconfig_field(content, target, var_name):
+    """Return gradle text with a buildConfigField for var_name, or None without an android block"""
     # Add buildConfigField
-    if target.suffix == ".kts":
-        build_config_line = f'        buildConfigField("String", "{var_name}", "\\"${{project.findProperty(\\"{var_name}\\") ?: \\"\\"}}\\")'
-    else:
-        build_config_line = f'        buildConfigField "String", "{var_name}", "\\"${{project.findProperty(\\"{var_name}\\") ?: \\"\\"}}\\"'
+    build_config_line = BUILD_CONFIG_FIELDS[target.suffix] % {"name": var_name}
     
     # Find android block and add buildConfigField
-    android_pattern = r'android\s*{'
-    match = re.search(android_pattern, content)
+    match = _RE_ANDROID_BLOCK.search(content)
+    if not match:
+        return None
     
-    if match:
-        # Look for existing defaultConfig block
-        default_config_pattern = r'(defaultConfig\s*{[^}]*})'
-        default_config_match = re.search(default_config_pattern, content, re.DOTALL)
-        
-        if default_config_match:
-            # Add inside defaultConfig block
-            default_config_content = default_config_match.group(1)
-            # Insert before the closing brace
-            new_default_config = default_config_content[:-1] + f'\n{build_config_line}\n    }}'
-            new_content = content.replace(default_config_content, new_default_config)
-        else:
-            # Add defaultConfig block after android {
-            insert_pos = match.end()
-            new_content = (content[:insert_pos] + 
-                          f'\n    defaultConfig {{\n{build_config_line}\n    }}\n' + 
-                          content[insert_pos:])
-        
-        target.write_text(new_content)
-        return True
+    # Look for existing defaultConfig block
+    default_config_match = _RE_DEFAULT_CONFIG.search(content)
+    
+    if default_config_match:
+        # Add inside defaultConfig block
+        default_config_content = default_config_match.group(1)
+        # Insert before the closing brace
+        new_default_config = default_config_content[:-1] + f'\n{build_config_line}\n    }}'
+        return content.replace(default_config_content, new_default_config)
+    
+    # Add defaultConfig block after android {
+    insert_pos = match.end()
+    return (content[:insert_pos] + 
+            f'\n    defaultConfig {{\n{build_config_line}\n    }}\n' + 
+            content[insert_pos:])
+
+def _expose_in_buildconfig_unchecked(files, var_name, content, target):
+    """Expose var_name in already-read gradle content the caller knows lacks it"""
+    if content is None:
+        return False
     
-    return False
+    new_content = _insert_buildconfig_field(content, target, var_name)
+    if new_content is None:
+        return False
+    
+    files.write(target, new_content)
+    return True
+
+# ---------- source scanning functions ----------
+@dataclass
+class SourceIndex:
+    """Kotlin/Java files under app/src, by extension and by file stem"""
+    kt: list
+    java: list
+    by_stem: dict
+    # mtime of every directory walked (None if missing), to tell when the scan is stale
+    dirs: dict
+
+# What the main source set scan covers, so the scan of the rest of app/src can skip it
+_MAIN_SOURCE_DIR_NAMES = frozenset(os.fspath(base) for base in MAIN_SOURCE_DIRS)
+
+def _dir_mtime(path):
+    """Directory mtime in ns, or None if it does not exist"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def _walk_sources(base, seen, skip=frozenset()):
+    """Yield Kotlin/Java files under base, skipping build output, hidden and skip directories
+    
+    Every directory is recorded in seen with its mtime, taken before it is listed.
+    """
+    seen[os.fspath(base)] = _dir_mtime(base)
+    for root, dirs, files in os.walk(base):
+        # Prune in place so os.walk never descends into skipped or hidden directories
+        dirs[:] = [d for d in dirs
+                   if d not in SKIP_DIRS and not d.startswith('.')
+                   and os.path.join(root, d) not in skip]
+        for d in dirs:
+            seen[os.path.join(root, d)] = _dir_mtime(os.path.join(root, d))
+        for name in files:
+            if name.endswith(SOURCE_EXTENSIONS):
+                yield Path(root, name)
+
+def _index_sources(bases, skip=frozenset()):
+    """Walk bases and index Kotlin/Java files by extension and by file stem"""
+    sources = SourceIndex(kt=[], java=[], by_stem={}, dirs={})
+    for base in bases:
+        for path in _walk_sources(base, sources.dirs, skip):
+            (sources.kt if path.suffix == ".kt" else sources.java).append(path)
+            sources.by_stem.setdefault(path.stem, []).append(path)
+    return sources
+
+@functools.lru_cache(maxsize=None)
+def _scan_main_sources():
+    """Walk src/main/java and src/main/kotlin, where the Application class usually lives"""
+    return _index_sources(MAIN_SOURCE_DIRS)
+
+@functools.lru_cache(maxsize=None)
+def _scan_other_sources():
+    """Walk the rest of app/src, skipping the directories _scan_main_sources covered"""
+    return _index_sources((SOURCE_ROOT,), skip=_MAIN_SOURCE_DIR_NAMES)
+
+# Main source sets first; the second walk only happens when the first one is not enough
+_SOURCE_SCANS = (_scan_main_sources, _scan_other_sources)
+
+def _drop_stale_source_scans():
+    """Forget cached scans whose directories gained, lost or renamed entries since the walk"""
+    # Adding or removing a file changes its directory's mtime, so re-stating the
+    # walked directories is enough to catch sources created after a prewarm
+    for scan in _SOURCE_SCANS:
+        if scan.cache_info().currsize and any(
+                _dir_mtime(d) != mtime for d, mtime in scan().dirs.items()):
+            scan.cache_clear()
+
+# Absolute path -> ((mtime_ns, size), text), least recently used first
+_TEXT_CACHE = OrderedDict()
+_TEXT_CACHE_SIZE = 256
+# The context loads read files from several worker threads at once
+_TEXT_CACHE_LOCK = threading.Lock()
+
+def _read_cached(path):
+    """Read a file, reusing the cached text while the file is unchanged"""
+    # Key on the absolute path: the server may be pointed at another project
+    # between calls, where the same relative path names a different file
+    abs_path = os.path.abspath(path)
+    # Open first and fstat the handle: a missing file fails in open(), and an
+    # existing one costs no separate stat()
+    with open(abs_path) as fh:
+        st = os.fstat(fh.fileno())
+        version = (st.st_mtime_ns, st.st_size)
+        with _TEXT_CACHE_LOCK:
+            cached = _TEXT_CACHE.get(abs_path)
+            if cached is not None and cached[0] == version:
+                _TEXT_CACHE.move_to_end(abs_path)
+                return cached[1]
+        text = fh.read()
+    
+    with _TEXT_CACHE_LOCK:
+        _TEXT_CACHE[abs_path] = (version, text)
+        _TEXT_CACHE.move_to_end(abs_path)
+        if len(_TEXT_CACHE) > _TEXT_CACHE_SIZE:
+            _TEXT_CACHE.popitem(last=False)
+    return text
+
+def _peek(path, n=8192):
+    """Read only the first n raw bytes of a file; class declarations sit near the top"""
+    with open(path, 'rb') as fh:
+        return fh.read(n)
+
+def _contains_any(path, needles, required=b""):
+    """Check raw file bytes for any of needles (and required) without reading into Python"""
+    with open(path, 'rb') as fh:
+        # Mapping tiny (or empty) files costs more than reading them
+        if os.fstat(fh.fileno()).st_size < 128:
+            data = fh.read()
+            return required in data and any(n in data for n in needles)
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return mm.find(required) != -1 and any(mm.find(n) != -1 for n in needles)
+
+def iter_source_files(sources):
+    """Iterate over a scan's Kotlin files followed by its Java files"""
+    yield from sources.kt
+    yield from sources.java
 
 # ---------- application/activity finding functions ----------
+def _is_application_source(file):
+    """Check if a source file declares a class that extends Application"""
+    try:
+        # The class declaration follows package/imports, so a prefix is enough
+        return _RE_APP_MARKER.search(_peek(file)) is not None
+    except Exception:
+        # Skip files that can't be read
+        return False
+
 def find_application_class():
     """Find Application class files by scanning all Java/Kotlin files"""
-    # Look through all source files, not just ones with "Application" in the name
-    all_files = (list(Path("app/src").rglob("*.kt")) +
-                 list(Path("app/src").rglob("*.java")))
-    
-    for file in all_files:
-        try:
-            content = file.read_text()
-            # Check if this file contains a class that extends Application
-            if ("extends Application" in content or 
-                ": Application()" in content or 
-                ": Application " in content):
+    # Look through all source files, not just ones with "Application" in the name.
+    # Most projects keep it in src/main/java or src/main/kotlin, so the rest of
+    # app/src is only walked when those do not have it
+    for scan in _SOURCE_SCANS:
+        for file in iter_source_files(scan()):
+            if _is_application_source(file):
                 return file
-        except Exception:
-            # Skip files that can't be read
-            continue
     
     return None
 
+def find_launcher_activity_name():
+    """Return the android:name of the MAIN/LAUNCHER activity declared in AndroidManifest.xml"""
+    # Stream the manifest and stop at the first launcher activity instead of
+    # building the whole tree
+    try:
+        with open(MANIFEST_PATH, 'rb') as fh:
+            for _, element in ET.iterparse(fh, events=("end",)):
+                if element.tag != "activity":
+                    continue
+                for intent_filter in element.iter("intent-filter"):
+                    actions = {a.get(f"{ANDROID_NS}name") for a in intent_filter.iter("action")}
+                    categories = {c.get(f"{ANDROID_NS}name") for c in intent_filter.iter("category")}
+                    if ACTION_MAIN in actions and CATEGORY_LAUNCHER in categories:
+                        return element.get(f"{ANDROID_NS}name")
+                # Drop activities already checked so memory stays flat on big manifests
+                element.clear()
+    except ET.ParseError:
+        return _scan_launcher_activity_name(MANIFEST_PATH.read_text())
+    return None
+
+def _scan_launcher_activity_name(manifest):
+    """Regex fallback for manifests that are not well-formed XML"""
+    for match in _RE_ACTIVITY.finditer(manifest):
+        body = match.group(2)
+        if body and ACTION_MAIN in body and CATEGORY_LAUNCHER in body:
+            name = _RE_ANDROID_NAME.search(match.group(1))
+            if name:
+                return name.group(1)
+    return None
+
 def find_launcher_activity():
     """Find the LAUNCHER activity from AndroidManifest.xml"""
-    if not MANIFEST_PATH.exists():
-        return None
-    
     try:
-        manifest_content = MANIFEST_PATH.read_text()
-        
-        # Find LAUNCHER activity
-        launcher_pattern = r'<activity[^>]*android:name="([^"]*)"[^>]*>.*?<action[^>]*android:name="android\.intent\.action\.MAIN"[^>]*/>.*?<category[^>]*android:name="android\.intent\.category\.LAUNCHER"[^>]*/>.*?</activity>'
-        match = re.search(launcher_pattern, manifest_content, re.DOTALL)
+        try:
+            activity_name = find_launcher_activity_name()
+        except FileNotFoundError:
+            # No manifest, no launcher activity
+            return None
         
-        if match:
-            activity_name = match.group(1)
-            # Convert to file path
-            if activity_name.startswith('.'):
-                # Relative to package
-                activity_name = activity_name[1:]  # Remove leading dot
-            
-            # Try to find the activity file
-            kt_files = list(Path("app/src").rglob(f"*{activity_name}*.kt"))
-            java_files = list(Path("app/src").rglob(f"*{activity_name}*.java"))
+        if activity_name:
+            # ".MainActivity" and "com.example.MainActivity" both name the MainActivity class
+            class_name = activity_name.split('.')[-1]
             
-            all_files = kt_files + java_files
-            for file in all_files:
-                content = file.read_text()
-                if (activity_name.split('.')[-1] in content and 
-                    ("extends Activity" in content or 
-                     "extends AppCompatActivity" in content or
-                     ": Activity" in content or
-                     ": AppCompatActivity" in content)):
-                    return file
+            # Look the activity file up by class name among the already scanned sources
+            # Candidates are only tested as raw bytes; the chosen one is decoded later
+            class_marker = class_name.encode()
+            for scan in _SOURCE_SCANS:
+                for file in scan().by_stem.get(class_name, []):
+                    try:
+                        if _contains_any(file, _ACTIVITY_MARKERS, required=class_marker):
+                            return file
+                    except FileNotFoundError:
+                        # Removed since the scan; try the other candidates
+                        continue
     except Exception as e:
-        print(f"Error parsing manifest: {e}")
+        # stdout carries the MCP stdio stream, so diagnostics go to stderr
+        print(f"Error parsing manifest: {e}", file=sys.stderr)
     
     return None
 
-def add_imports_to_file(file_path, is_kotlin):
-    """Add UXCam imports to a file if not already present"""
-    content = file_path.read_text()
+# Init templates split around their single %s once at import, so rendering
+# is plain concatenation instead of %-formatting
+_SNIPPET_PARTS = {True: KOTLIN_SNIPPET.split("%s"), False: JAVA_SNIPPET.split("%s")}
+
+@functools.lru_cache(maxsize=32)
+def _render_snippet(is_kotlin, app_key_expr):
+    """Render the init snippet for a key expression; callers repeat the same few keys"""
+    head, tail = _SNIPPET_PARTS[is_kotlin]
+    return head + app_key_expr + tail
+
+def _uxcam_markers(content):
+    """Return which UXCam init/import markers appear in content"""
+    found = set()
+    for match in _RE_UXCAM_MARKERS.finditer(content):
+        found.add(match.group(0))
+        if len(found) == 2:
+            break
+    return found
+
+def add_imports(content, is_kotlin, has_import=None):
+    """Return content with the UXCam imports added if not already present"""
     imports = KOTLIN_IMPORTS if is_kotlin else JAVA_IMPORTS
     
-    # Check if imports already exist
-    if "import com.uxcam.UXCam" in content:
+    # Check if imports already exist (callers that scanned already pass the answer)
+    if has_import is None:
+        has_import = _IMPORT_MARKER in content
+    if has_import:
         return content
     
-    # Find where to insert imports (after package declaration)
-    lines = content.split('\n')
-    insert_index = 0
-    
-    for i, line in enumerate(lines):
-        if line.strip().startswith('package '):
-            insert_index = i + 1
-            break
-        elif line.strip().startswith('import ') and insert_index == 0:
-            insert_index = i
-            break
-    
-    # Insert imports
-    import_lines = imports.split('\n')
-    for j, import_line in enumerate(import_lines):
-        lines.insert(insert_index + j, import_line)
+    # Insert after the package declaration, else before the first import, else at the top
+    match = _RE_PACKAGE.search(content)
+    if match and not match.group().endswith('\n'):
+        # The package declaration is the last line; start a new one for the imports
+        return content + '\n' + imports
+    if match:
+        insert_pos = match.end()
+    else:
+        match = _RE_FIRST_IMPORT.search(content)
+        insert_pos = match.start() if match else 0
     
-    return '\n'.join(lines)
+    return content[:insert_pos] + imports + '\n' + content[insert_pos:]
 
-def inject_init_in_application(app_file, app_key_expr):
+def inject_init_in_application(app_file, content, app_key_expr):
     """Inject UXCam initialization in Application.onCreate()"""
     is_kotlin = app_file.suffix == ".kt"
-    content = app_file.read_text()
     
     # Check if already initialized
-    if "UXCam.startWithConfiguration" in content:
-        return f"ℹ️ UXCam already initialized in {app_file.name}"
+    markers = _uxcam_markers(content)
+    if _INIT_MARKER in markers:
+        return None, f"ℹ️ UXCam already initialized in {app_file.name}"
     
     # Add imports
-    content = add_imports_to_file(app_file, is_kotlin)
+    content = add_imports(content, is_kotlin, _IMPORT_MARKER in markers)
     
     # Add initialization code to onCreate()
-    snippet = (KOTLIN_SNIPPET if is_kotlin else JAVA_SNIPPET) % app_key_expr
+    snippet = _render_snippet(is_kotlin, app_key_expr)
     
-    # Look for onCreate method
-    if is_kotlin:
-        pattern = r'override\s+fun\s+onCreate\s*\(\s*\)\s*{'
-    else:
-        pattern = r'@Override\s*\n\s*public\s+void\s+onCreate\s*\(\s*\)\s*{'
+    # Insert after super.onCreate(), or right after the opening brace without one
+    oncreate_re = _RE_KT_APP_ONCREATE if is_kotlin else _RE_JAVA_APP_ONCREATE
+    content, found = oncreate_re.subn(lambda m: m.group(0) + '\n' + snippet, content, count=1)
+    if not found:
+        return None, f"⚠️ Could not find onCreate() method in {app_file.name}"
     
-    match = re.search(pattern, content, re.MULTILINE)
-    if match:
-        # Find the super.onCreate() call and add after it
-        start_pos = match.end()
-        super_pattern = r'super\.onCreate\s*\(\s*\)\s*;?' if not is_kotlin else r'super\.onCreate\s*\(\s*\)'
-        super_match = re.search(super_pattern, content[start_pos:])
-        
-        if super_match:
-            insert_pos = start_pos + super_match.end()
-            content = content[:insert_pos] + '\n' + snippet + content[insert_pos:]
-        else:
-            # No super call found, add right after opening brace
-            content = content[:start_pos] + '\n' + snippet + content[start_pos:]
-    else:
-        return f"⚠️ Could not find onCreate() method in {app_file.name}"
-    
-    app_file.write_text(content)
-    return f"✔️ Added UXCam initialization to {app_file.name}"
+    return content, f"✔️ Added UXCam initialization to {app_file.name}"
 
-def inject_init_in_activity(activity_file, app_key_expr):
+def inject_init_in_activity(activity_file, content, app_key_expr):
     """Inject UXCam initialization in Activity.onCreate()"""
     is_kotlin = activity_file.suffix == ".kt"
-    content = activity_file.read_text()
     
     # Check if already initialized
-    if "UXCam.startWithConfiguration" in content:
-        return f"ℹ️ UXCam already initialized in {activity_file.name}"
+    markers = _uxcam_markers(content)
+    if _INIT_MARKER in markers:
+        return None, f"ℹ️ UXCam already initialized in {activity_file.name}"
     
     # Add imports
-    content = add_imports_to_file(activity_file, is_kotlin)
+    content = add_imports(content, is_kotlin, _IMPORT_MARKER in markers)
     
     # Add initialization code to onCreate()
-    snippet = (KOTLIN_SNIPPET if is_kotlin else JAVA_SNIPPET) % app_key_expr
-    
-    # Look for onCreate method
-    if is_kotlin:
-        pattern = r'override\s+fun\s+onCreate\s*\([^)]*\)\s*{'
-    else:
-        pattern = r'@Override\s*\n\s*protected\s+void\s+onCreate\s*\([^)]*\)\s*{'
+    snippet = _render_snippet(is_kotlin, app_key_expr)
     
-    match = re.search(pattern, content, re.MULTILINE)
-    if match:
-        # Find the super.onCreate() call and add after it
-        start_pos = match.end()
-        super_pattern = r'super\.onCreate\s*\([^)]*\)\s*;?' if not is_kotlin else r'super\.onCreate\s*\([^)]*\)'
-        super_match = re.search(super_pattern, content[start_pos:])
-        
-        if super_match:
-            insert_pos = start_pos + super_match.end()
-            content = content[:insert_pos] + '\n' + snippet + content[insert_pos:]
-        else:
-            # No super call found, add right after opening brace
-            content = content[:start_pos] + '\n' + snippet + content[start_pos:]
-    else:
-        return f"⚠️ Could not find onCreate() method in {activity_file.name}"
+    # Insert after super.onCreate(), or right after the opening brace without one
+    oncreate_re = _RE_KT_ONCREATE if is_kotlin else _RE_JAVA_ONCREATE
+    content, found = oncreate_re.subn(lambda m: m.group(0) + '\n' + snippet, content, count=1)
+    if not found:
+        return None, f"⚠️ Could not find onCreate() method in {activity_file.name}"
     
-    activity_file.write_text(content)
-    return f"✔️ Added UXCam initialization to {activity_file.name}"
+    return content, f"✔️ Added UXCam initialization to {activity_file.name}"
 
-def inject_init(app_key_input):
+def inject_init(ctx, app_key_input):
     """Updated inject_init with proper app key handling"""
     
     # Handle the app key properly
     if not app_key_input or app_key_input.strip() == "":
         app_key_result = handle_no_key_provided()
         if app_key_result.startswith("⚠️"):
-            return app_key_result
+            return None, app_key_result
         app_key_expr = app_key_result
     else:
-        app_key_expr = handle_app_key(app_key_input)
+        app_key_expr = handle_app_key(ctx.files, app_key_input)
         if app_key_expr.startswith("⚠️"):
-            return app_key_expr
+            return None, app_key_expr
+    
+    if ctx.integrated_path:
+        return None, f"ℹ️ UXCam already initialized in {ctx.integrated_path.name}"
     
     # Step 1: Try to find Application class
-    app_file = find_application_class()
-    if app_file:
-        return inject_init_in_application(app_file, app_key_expr)
+    if ctx.app_class_path:
+        return inject_init_in_application(ctx.app_class_path, ctx.files.read(ctx.app_class_path),
+                                          app_key_expr)
     
     # Step 2: Fallback to LAUNCHER activity
-    launcher_activity = find_launcher_activity()
-    if launcher_activity:
-        return inject_init_in_activity(launcher_activity, app_key_expr)
+    if ctx.launcher_path:
+        return inject_init_in_activity(ctx.launcher_path, ctx.files.read(ctx.launcher_path),
+                                       app_key_expr)
     
     # Step 3: No suitable location found
-    return "⚠️ Could not find Application class or LAUNCHER activity to add UXCam initialization"
+    return None, "⚠️ Could not find Application class or LAUNCHER activity to add UXCam initialization"
+
+# ---------- integration driver ----------
+@dataclass
+class IntegrationContext:
+    """Files touched by one integration run; their text lives in the shared FileCache"""
+    files: FileCache
+    settings_target: Path
+    gradle_target: Path
+    app_class_path: Path | None = None
+    launcher_path: Path | None = None
+    integrated_path: Path | None = None
+
+    def init_path(self):
+        """The file that receives the init call"""
+        return self.app_class_path or self.launcher_path
+
+def _load_script(files, kts_path, groovy_path):
+    """Pick the Kotlin DSL or Groovy flavour of a build script and read it"""
+    target = kts_path if files.exists(kts_path) else groovy_path
+    files.read(target)
+    return target
+
+def _integration_marker():
+    """Marker file for the project in the working directory, keyed on its absolute path"""
+    project = os.path.abspath(os.curdir).encode()
+    return INTEGRATION_CACHE_DIR / hashlib.sha1(project).hexdigest()
+
+def _recorded_integration():
+    """Return the file recorded by a previous run if it still holds the init call"""
+    try:
+        path = Path(_integration_marker().read_text().strip())
+        if _INIT_MARKER.encode() in _peek(path):
+            return path
+    except OSError:
+        pass
+    return None
+
+def _record_integration(path):
+    """Remember the file holding the init call for the next run"""
+    # Only an optimisation; without the marker the next run scans app/src again.
+    # Written after flush and outside the FileCache so a failure here can never
+    # stop the project edits from landing
+    marker = _integration_marker()
+    recorded = os.path.abspath(path)
+    try:
+        if marker.read_text() == recorded:
+            return
+    except OSError:
+        pass
+    try:
+        marker.parent.mkdir(parents=True, exist_ok=True)
+        marker.write_text(recorded)
+    except OSError:
+        pass
+
+def _locate_init_targets(files):
+    """Find the Application class, or the launcher activity if there is none"""
+    # A previous run already integrated UXCam, no need to walk app/src
+    integrated_path = _recorded_integration()
+    if integrated_path:
+        return {"integrated_path": integrated_path}
+    
+    app_class_path = find_application_class()
+    if app_class_path:
+        files.read(app_class_path)
+        return {"app_class_path": app_class_path}
+    
+    # The launcher activity only matters when there is no Application class
+    launcher_path = find_launcher_activity()
+    if launcher_path:
+        files.read(launcher_path)
+        return {"launcher_path": launcher_path}
+    return {}
+
+async def _prepare_context():
+    """Locate every file the integration touches and read each one once"""
+    files = FileCache()
+    # settings.gradle, app/build.gradle and the app/src scan are independent,
+    # so load them concurrently in worker threads
+    settings_target, gradle_target, init_targets = await asyncio.gather(
+        asyncio.to_thread(_load_script, files, SETTINGS_KTS, SETTINGS_GROOVY),
+        asyncio.to_thread(_load_script, files, GRADLE_KTS, GRADLE_GROOVY),
+        asyncio.to_thread(_locate_init_targets, files),
+    )
+    return IntegrationContext(files, settings_target, gradle_target, **init_targets)
+
+def integrate(ctx, app_key_ref):
+    """Run all integration steps over a prepared context and write back changed files"""
+    files = ctx.files
+    # The steps all edit app/build.gradle, so unlike the loads they run in order
+    repo = add_repo(ctx.settings_target, files.read(ctx.settings_target))
+    if repo is not None:
+        repo_report = files.apply(ctx.settings_target, repo)
+    else:
+        repo_report = files.apply(ctx.gradle_target, add_repo_fallback(
+            ctx.gradle_target, files.read(ctx.gradle_target)))
+    
+    reports = [repo_report]
+    if repo_report == _NO_BUILD_SCRIPTS:
+        return _finish(files, reports)
+    
+    dependency_report = files.apply(ctx.gradle_target, add_dependency(
+        ctx.gradle_target, files.read(ctx.gradle_target)))
+    reports.append(dependency_report)
+    if dependency_report == _NO_APP_GRADLE:
+        # Without the dependency an init call would not compile; skip the key handling too
+        return _finish(files, reports)
+    
+    init_path = ctx.init_path()
+    new_init, init_report = inject_init(ctx, app_key_ref)  # Now handles empty/invalid keys properly
+    if new_init is not None:
+        files.write(init_path, new_init)
+    reports.append(init_report)
+    
+    result = _finish(files, reports)
+    if init_path and _INIT_MARKER in files.read(init_path):
+        _record_integration(init_path)
+    return result
+
+def _finish(files, reports):
+    """Write back the edits made so far and join the step reports"""
+    files.flush()
+    return "; ".join([r for r in reports if r])
 
 # ---------- MCP Server ----------
-app = Server("uxcam-android-integration")
-
-@app.list_tools()
-async def handle_list_tools() -> list[Tool]:
-    """List available tools"""
-    return [
-        Tool(
-            name="add_uxcam_android",
-            description="Add UXCam SDK (v3.+) & init call to an Android project",
-            inputSchema={
-                "type": "object",
-                "properties": {
-                    "appKeyRef": {
-                        "type": "string",
-                        "description": "Reference used in code – e.g. BuildConfig.UXCAM_KEY, UXCAM_KEY, or actual key"
-                    }
-                },
-                "required": ["appKeyRef"]
-            }
-        )
-    ]
-
-@app.call_tool()
-async def handle_call_tool(name: str, arguments: dict) -> Sequence[TextContent]:
-    """Handle tool calls"""
-    if name == "add_uxcam_android":
-        app_key_ref = arguments.get("appKeyRef", "")  # Empty default instead of assuming
-        
-        reports = [
-            add_repo(),
-            add_dependency(),
-            inject_init(app_key_ref)  # Now handles empty/invalid keys properly
+# Serialises add_uxcam_android calls; they all edit the same project files
+_INTEGRATION_LOCK = asyncio.Lock()
+
+async def run_integration(app_key_ref):
+    """Integrate UXCam into the project in the working directory and return the report"""
+    # File work runs in worker threads so the stdio transport keeps pumping;
+    # the lock stops two requests from editing the same files at once
+    async with _INTEGRATION_LOCK:
+        # The project may have changed since the prewarm or the last call;
+        # reuse a cached scan only while its directories are untouched
+        await asyncio.to_thread(_drop_stale_source_scans)
+        ctx = await _prepare_context()
+        return await asyncio.to_thread(integrate, ctx, app_key_ref)
+
+@functools.lru_cache(maxsize=None)
+def _get_app():
+    """Build the MCP server and register the tool handlers on first use"""
+    # The MCP SDK loads here rather than at import, so the integration helpers
+    # can be imported without it
+    from mcp.server import Server
+    from mcp.types import Tool, TextContent
+    
+    app = Server("uxcam-android-integration")
+    
+    @app.list_tools()
+    async def handle_list_tools() -> list[Tool]:
+        """List available tools"""
+        return [
+            Tool(
+                name="add_uxcam_android",
+                description="Add UXCam SDK (v3.+) & init call to an Android project",
+                inputSchema={
+                    "type": "object",
+                    "properties": {
+                        "appKeyRef": {
+                            "type": "string",
+                            "description": "Reference used in code – e.g. BuildConfig.UXCAM_KEY, UXCAM_KEY, or actual key"
+                        }
+                    },
+                    "required": ["appKeyRef"]
+                }
+            )
         ]
-        result = "; ".join([r for r in reports if r])
-        
-        return [TextContent(type="text", text=result)]
-    else:
-        raise ValueError(f"Unknown tool: {name}")
+    
+    @app.call_tool()
+    async def handle_call_tool(name: str, arguments: dict) -> Sequence[TextContent]:
+        """Handle tool calls"""
+        if name == "add_uxcam_android":
+            app_key_ref = arguments.get("appKeyRef", "")  # Empty default instead of assuming
+            result = await run_integration(app_key_ref)
+            return [TextContent(type="text", text=result)]
+        else:
+            raise ValueError(f"Unknown tool: {name}")
+    
+    return app
+
+async def _prewarm():
+    """Fill the source scan and file caches before the first tool call arrives"""
+    # The key most projects end up with; render both flavours up front
+    for is_kotlin in (True, False):
+        _render_snippet(is_kotlin, 'BuildConfig.UXCAM_KEY')
+    
+    # Hold the lock so a tool call arriving mid-scan waits for (and reuses) this
+    # scan instead of walking app/src alongside it
+    async with _INTEGRATION_LOCK:
+        try:
+            await _prepare_context()
+        except Exception:
+            # Best effort only; the tool call itself reports any real problem
+            pass
 
 async def main():
     # Run the server using stdio transport
     from mcp.server.stdio import stdio_server
     
-    async with stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            app.create_initialization_options()
-        )
+    app = _get_app()
+    
+    # Hide the first call's scan latency behind the client handshake; keep a
+    # reference so the task is not garbage collected while it runs
+    prewarm = asyncio.create_task(_prewarm())
+    
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await app.run(
+                read_stream,
+                write_stream,
+                app.create_initialization_options()
+            )
+    finally:
+        # Stop a prewarm that is still running and surface anything it raised
+        prewarm.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await prewarm
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file